@@ -1,6 +1,12 @@
-from flask import Flask, render_template, request, send_file
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
+
+from flask import Flask, Response, render_template, request, send_file
+import orjson
 import pandas as pd
-from google.cloud import bigquery
+from google.cloud import bigquery, bigquery_storage
 from io import BytesIO
 
 app = Flask(__name__)
@@ -10,100 +16,225 @@ app = Flask(__name__)
 # ============================
 PROJECT_ID = "eventos-479403"
 DATASET_TABLE = "eventos_pozos.eventos_fix"   # ⚠ ahora apuntamos a eventos_fix
+                                              #   (particionada por mes y
+                                              #   clusterizada, ver sql/)
 TABLE_ID = f"{PROJECT_ID}.{DATASET_TABLE}"
+# Resumen por (pozo, evento) precalculado en una vista materializada (ver sql/)
+RESUMEN_TABLE = "eventos_pozos.eventos_resumen_mv"
+RESUMEN_ID = f"{PROJECT_ID}.{RESUMEN_TABLE}"
+# Lista de pozos distintos, también materializada (ver sql/)
+POZOS_TABLE = "eventos_pozos.pozos_mv"
+POZOS_ID = f"{PROJECT_ID}.{POZOS_TABLE}"
+
+# Columnas del detalle de un evento, en el orden de la tabla y del Excel
+COLUMNAS_DETALLE = [
+    "step_no",
+    "time_from",
+    "time_to",
+    "rig_name",
+    "loc_fed_lease_no",
+    "well_legal_name",
+    "activity_class_desc",
+    "activity_code_desc",
+    "activity_duration",
+    "expr1",
+    "activity_subcode2",
+    "date_ops_start",
+    "date_ops_end",
+    "event_code",
+    "event_objective_1",
+    "event_objective_2",
+]
+
+# Cada cuánto se vencen los resultados cacheados en memoria (segundos)
+CACHE_TTL_SEG = 600
 
 bq_client = bigquery.Client(project=PROJECT_ID)
+# Storage Read API: baja los resultados en Arrow por streams paralelos
+bq_storage = bigquery_storage.BigQueryReadClient()
+
+# Threads para lanzar consultas independientes en paralelo dentro de un request
+_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def _job_config(*params):
+    """
+    Config común de las consultas parametrizadas. (La caché de resultados
+    de BigQuery ya viene activada por defecto; no hace falta pedirla.)
+    """
+    return bigquery.QueryJobConfig(query_parameters=list(params))
+
+
+def _ttl_hash():
+    """
+    Valor que cambia cada CACHE_TTL_SEG segundos. Se pasa como argumento
+    extra a las funciones con lru_cache para que sus entradas venzan.
+    """
+    return int(time.time() // CACHE_TTL_SEG)
+
 
 # -------------------------------------------------
 # Helpers de consulta a BigQuery (sin traer todo)
 # -------------------------------------------------
 def get_pozos():
-    """Devuelve lista de pozos (well_legal_name) distintos."""
+    """Devuelve lista de pozos (well_legal_name) distintos (cacheada CACHE_TTL_SEG)."""
+    return list(_get_pozos(_ttl_hash()))
+
+
+@lru_cache(maxsize=1)
+def _get_pozos(_ttl):
     query = f"""
-        SELECT DISTINCT well_legal_name
-        FROM `{TABLE_ID}`
-        WHERE well_legal_name IS NOT NULL
+        SELECT well_legal_name
+        FROM `{POZOS_ID}`
         ORDER BY well_legal_name
     """
-    df = bq_client.query(query).to_dataframe()
-    return df["well_legal_name"].tolist()
+    # Resultado chico: se recorre el RowIterator directo, sin Arrow/pandas
+    rows = bq_client.query(query, job_config=_job_config()).result()
+    return tuple(row[0] for row in rows)
 
 
 def get_eventos_de_pozo(pozo):
     """
-    Devuelve un DataFrame con un evento por fila para el pozo:
-      - event_id
-      - date_ops_start (mínima)
-      - date_ops_end   (máxima)
-      - event_objective_1 (cualquiera)
+    Devuelve la lista de eventos del pozo, lista para el <select>:
+      [{"event_id": ..., "label": "event_id | inicio → fin | objetivo",
+        "fecha_desde": date, "fecha_hasta": date}, ...]
+    (fecha_desde/hasta: rango de date_ops_start de los steps del evento)
+    Las etiquetas vienen armadas desde la consulta, así index() no hace
+    ninguna operación sobre DataFrames.
     """
+    return list(_get_eventos_de_pozo(pozo, _ttl_hash()))
+
+
+@lru_cache(maxsize=512)
+def _get_eventos_de_pozo(pozo, _ttl):
+    # Lee del resumen precalculado (un registro por evento, sin GROUP BY
+    # sobre los steps). El label se arma en BigQuery (fecha ISO o "s/f" si
+    # falta), así no hay que formatear fechas fila por fila en Python.
     query = f"""
         SELECT
             event_id,
-            MIN(date_ops_start) AS date_ops_start,
-            MAX(date_ops_end)   AS date_ops_end,
-            ANY_VALUE(event_objective_1) AS event_objective_1
-        FROM `{TABLE_ID}`
+            CONCAT(
+                event_id, ' | ',
+                IFNULL(FORMAT_DATE('%Y-%m-%d', DATE(date_ops_start)), 's/f'), ' → ',
+                IFNULL(FORMAT_DATE('%Y-%m-%d', DATE(date_ops_end)), 's/f'), ' | ',
+                IFNULL(event_objective_1, '')
+            ) AS label,
+            DATE(date_ops_start)     AS fecha_desde,
+            DATE(date_ops_start_max) AS fecha_hasta
+        FROM `{RESUMEN_ID}`
         WHERE well_legal_name = @pozo
-        GROUP BY event_id
         ORDER BY date_ops_start DESC
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("pozo", "STRING", pozo)
-        ]
+    job_config = _job_config(
+        bigquery.ScalarQueryParameter("pozo", "STRING", pozo),
     )
-    df = bq_client.query(query, job_config=job_config).to_dataframe()
+    rows = bq_client.query(query, job_config=job_config).result()
 
-    # Aseguramos tipos fecha
-    for col in ["date_ops_start", "date_ops_end"]:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce")
+    return tuple(dict(row.items()) for row in rows)
 
-    return df
+
+def get_eventos_por_id(pozo):
+    """
+    Eventos del pozo indexados por event_id (como str), para validar o
+    buscar un evento sin recorrer la lista. Cacheado junto con la lista:
+    se devuelve una vista de sólo lectura, y los dicts de cada evento
+    también son compartidos, así que no deben modificarse.
+    """
+    return MappingProxyType(_get_eventos_por_id(pozo, _ttl_hash()))
+
+
+@lru_cache(maxsize=512)
+def _get_eventos_por_id(pozo, _ttl):
+    return {str(e["event_id"]): e for e in _get_eventos_de_pozo(pozo, _ttl)}
 
 
 def get_detalle_evento(pozo, event_id):
     """
-    Devuelve el detalle de un evento (todas las filas / steps) para un pozo y event_id.
+    Devuelve el detalle de un evento (todas las filas / steps) para un pozo y event_id,
+    como pyarrow.Table (sin pasar por pandas). La tabla queda cacheada.
     """
+    return _get_detalle_evento(pozo, event_id, _ttl_hash())
+
+
+@lru_cache(maxsize=256)
+def _get_detalle_evento(pozo, event_id, _ttl):
+    params = [
+        bigquery.ScalarQueryParameter("pozo", "STRING", pozo),
+        bigquery.ScalarQueryParameter("event_id", "STRING", event_id),
+    ]
+
+    # Rango de fechas del evento (sale del resumen, ya cacheado): permite
+    # que BigQuery descarte particiones además de bloques del cluster.
+    filtro_fechas = ""
+    evento = _get_eventos_por_id(pozo, _ttl).get(event_id)
+    if evento and evento["fecha_desde"] and evento["fecha_hasta"]:
+        # Sobre la columna de partición "pelada" (sin DATE(...)) para que
+        # BigQuery pueda podar particiones.
+        filtro_fechas = """
+          AND ((date_ops_start >= DATETIME(@desde)
+                AND date_ops_start < DATETIME(DATE_ADD(@hasta, INTERVAL 1 DAY)))
+               OR date_ops_start IS NULL)"""
+        params += [
+            bigquery.ScalarQueryParameter("desde", "DATE", evento["fecha_desde"]),
+            bigquery.ScalarQueryParameter("hasta", "DATE", evento["fecha_hasta"]),
+        ]
+
     query = f"""
-        SELECT
-            step_no,
-            time_from,
-            time_to,
-            rig_name,
-            loc_fed_lease_no,
-            well_legal_name,
-            activity_class_desc,
-            activity_code_desc,
-            activity_duration,
-            expr1,
-            activity_subcode2,
-            date_ops_start,
-            date_ops_end,
-            event_code,
-            event_objective_1,
-            event_objective_2
+        SELECT {", ".join(COLUMNAS_DETALLE)}
         FROM `{TABLE_ID}`
         WHERE well_legal_name = @pozo
-          AND event_id       = @event_id
+          AND event_id       = @event_id{filtro_fechas}
         ORDER BY time_from
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("pozo", "STRING", pozo),
-            bigquery.ScalarQueryParameter("event_id", "STRING", event_id),
-        ]
+    job_config = _job_config(*params)
+    return bq_client.query(query, job_config=job_config).result().to_arrow(
+        progress_bar_type=None, bqstorage_client=bq_storage
     )
-    df = bq_client.query(query, job_config=job_config).to_dataframe()
 
-    # Aseguramos fechas/horas como datetime
+
+def get_detalle_json(pozo, event_id):
+    """
+    Devuelve el detalle de un evento ya serializado a JSON (bytes), listo
+    para responder tal cual. Queda cacheado igual que get_detalle_evento.
+    """
+    return _get_detalle_json(pozo, event_id, _ttl_hash())
+
+
+@lru_cache(maxsize=256)
+def _get_detalle_json(pozo, event_id, _ttl):
+    tabla = _get_detalle_evento(pozo, event_id, _ttl)
+    # default=str cubre tipos que orjson no serializa solo (p.ej. NUMERIC)
+    return orjson.dumps(tabla.to_pylist(), default=str)
+
+
+def get_detalle_excel(pozo, event_id):
+    """
+    Devuelve el detalle de un evento como archivo .xlsx (bytes), o None si
+    no hay filas. Queda cacheado: exportar dos veces el mismo evento no
+    vuelve a armar el DataFrame ni el Excel.
+    """
+    return _get_detalle_excel(pozo, event_id, _ttl_hash())
+
+
+@lru_cache(maxsize=64)
+def _get_detalle_excel(pozo, event_id, _ttl):
+    tabla = _get_detalle_evento(pozo, event_id, _ttl)
+    if tabla is None or tabla.num_rows == 0:
+        return None
+
+    df = tabla.to_pandas()
+
+    # Aseguramos fechas/horas como datetime (Excel las toma como fecha).
+    # Si ya vienen tipadas desde Arrow no hay nada que parsear.
     for col in ["time_from", "time_to", "date_ops_start", "date_ops_end"]:
-        if col in df.columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
             df[col] = pd.to_datetime(df[col], errors="coerce")
 
-    return df
+    # Armamos el Excel en memoria
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        df.to_excel(writer, index=False, sheet_name="Detalle")
+    return output.getvalue()
 
 
 # ============================
@@ -111,75 +242,37 @@ def get_detalle_evento(pozo, event_id):
 # ============================
 @app.route("/", methods=["GET"])
 def index():
-    # Lista de pozos para el combo
-    try:
-        pozos = get_pozos()
-    except Exception as e:
-        return f"Error consultando pozos en BigQuery: {e}", 500
+    # Lista de pozos para el combo: se pide en paralelo con eventos/detalle
+    pozos_fut = _executor.submit(get_pozos)
 
     pozo_sel = request.args.get("well")
     evento_sel = request.args.get("event")
 
     eventos = []
-    df_evento = None
+    tabla_detalle = None
 
     if pozo_sel:
-        # ---- Eventos del pozo seleccionado ----
-        eventos_df = get_eventos_de_pozo(pozo_sel)
-
-        # Construimos lista para el <select>
-        def fmt_fecha(x):
-            if pd.isna(x):
-                return "s/f"
-            try:
-                return x.date().isoformat()
-            except Exception:
-                return str(x)
-
-        for _, row in eventos_df.iterrows():
-            eventos.append(
-                {
-                    "event_id": row["event_id"],
-                    "label": f"{row['event_id']} | "
-                             f"{fmt_fecha(row['date_ops_start'])} → {fmt_fecha(row['date_ops_end'])} | "
-                             f"{row['event_objective_1']}",
-                }
-            )
+        # ---- Eventos del pozo seleccionado (ya con label) ----
+        eventos = get_eventos_de_pozo(pozo_sel)
 
         # ---- Validar que el evento seleccionado pertenezca al pozo ----
-        eventos_ids_pozo = set(eventos_df["event_id"].astype(str))
-        if evento_sel and evento_sel not in eventos_ids_pozo:
+        if evento_sel and evento_sel not in get_eventos_por_id(pozo_sel):
             evento_sel = None
 
         # ---- Detalle del evento (si hay evento válido) ----
         if evento_sel:
-            df_evento = get_detalle_evento(pozo_sel, evento_sel)
-
-    # Columnas a mostrar en la tabla (mismo orden que ya usabas)
-    columnas = [
-        "step_no",
-        "time_from",
-        "time_to",
-        "rig_name",
-        "loc_fed_lease_no",
-        "well_legal_name",
-        "activity_class_desc",
-        "activity_code_desc",
-        "activity_duration",
-        "expr1",
-        "activity_subcode2",
-        "date_ops_start",
-        "date_ops_end",
-        "event_code",
-        "event_objective_1",
-        "event_objective_2",
-    ]
+            tabla_detalle = get_detalle_evento(pozo_sel, evento_sel)
+
+    try:
+        pozos = pozos_fut.result()
+    except Exception as e:
+        return f"Error consultando pozos en BigQuery: {e}", 500
 
-    if df_evento is not None and not df_evento.empty:
-        columnas_presentes = [c for c in columnas if c in df_evento.columns]
-        tabla_evento = df_evento[columnas_presentes].to_dict(orient="records")
+    # La consulta ya trae sólo COLUMNAS_DETALLE, en el orden de la tabla
+    if tabla_detalle is not None and tabla_detalle.num_rows > 0:
+        # Filas directo desde Arrow, sin armar un DataFrame intermedio
+        tabla_evento = tabla_detalle.to_pylist()
     else:
-        columnas_presentes = columnas  # para que Jinja no rompa
         tabla_evento = None
 
     return render_template(
@@ -189,10 +282,31 @@ def index():
         eventos=eventos,
         evento_sel=evento_sel,
         tabla_evento=tabla_evento,
-        columnas=columnas_presentes,
+        columnas=COLUMNAS_DETALLE,
     )
 
 
+# ============================
+# RUTA: DETALLE EN JSON
+# ============================
+@app.route("/api/detalle", methods=["GET"])
+def api_detalle():
+    pozo = request.args.get("well")
+    evento = request.args.get("event")
+
+    if not pozo or not evento:
+        return "Faltan parámetros (well / event)", 400
+
+    # Mismo criterio que /exportar: evento inexistente o sin filas → 404
+    # (y no se cachean payloads vacíos para cualquier query string)
+    if evento not in get_eventos_por_id(pozo):
+        return "No hay datos para el evento", 404
+    if get_detalle_evento(pozo, evento).num_rows == 0:
+        return "No hay datos para el evento", 404
+
+    return Response(get_detalle_json(pozo, evento), mimetype="application/json")
+
+
 # ============================
 # RUTA: EXPORTAR DETALLE A EXCEL
 # ============================
@@ -204,41 +318,13 @@ def exportar_evento():
     if not pozo or not evento:
         return "Faltan parámetros (well / event)", 400
 
-    df = get_detalle_evento(pozo, evento)
-    if df is None or df.empty:
+    contenido = get_detalle_excel(pozo, evento)
+    if contenido is None:
         return "No hay datos para exportar", 404
 
-    # Ordenamos columnas igual que en la tabla (si querés)
-    columnas = [
-        "step_no",
-        "time_from",
-        "time_to",
-        "rig_name",
-        "loc_fed_lease_no",
-        "well_legal_name",
-        "activity_class_desc",
-        "activity_code_desc",
-        "activity_duration",
-        "expr1",
-        "activity_subcode2",
-        "date_ops_start",
-        "date_ops_end",
-        "event_code",
-        "event_objective_1",
-        "event_objective_2",
-    ]
-    cols_presentes = [c for c in columnas if c in df.columns]
-    df = df[cols_presentes]
-
-    # Armamos el Excel en memoria
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Detalle")
-    output.seek(0)
-
     filename = f"detalle_{pozo}_{evento}.xlsx"
     return send_file(
-        output,
+        BytesIO(contenido),
         as_attachment=True,
         download_name=filename,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
@@ -0,0 +1,56 @@
+-- DDL de una sola vez: rearma eventos_fix particionada por mes de inicio
+-- y clusterizada por pozo/evento/hora. Las consultas de app.py filtran
+-- por well_legal_name + event_id (y rango de date_ops_start en el
+-- detalle), así BigQuery lee sólo las particiones y bloques del evento.
+-- Al final la tabla conserva el nombre eventos_fix, así la carga sigue
+-- escribiendo donde escribe hoy.
+--
+-- ⚠ PAUSAR EL JOB DE CARGA mientras corre este script: lo que se escriba
+--   en eventos_fix entre el CREATE y el DROP se pierde.
+--
+-- Correr ANTES de eventos_resumen_mv.sql y pozos_mv.sql (si las vistas
+-- ya existían, recrearlas después de esto). Los permisos (IAM) y la
+-- descripción a nivel tabla no pasan a la tabla nueva: volver a
+-- aplicarlos después del RENAME.
+--
+-- BigQuery no deja cambiar la partición con CREATE OR REPLACE, por eso
+-- se arma eventos_fix_new al lado, se comparan las filas y recién
+-- entonces se reemplaza la vieja. Si algo falla antes del DROP, la
+-- tabla original queda intacta.
+--
+-- Partición mensual y no diaria: el límite es 4000 particiones por
+-- tabla (~11 años por día). Para ver el rango de fechas antes de correr:
+--   SELECT MIN(date_ops_start), MAX(date_ops_start),
+--          COUNT(DISTINCT DATETIME_TRUNC(date_ops_start, MONTH))
+--   FROM `eventos-479403.eventos_pozos.eventos_fix`;
+-- Se asume date_ops_start DATETIME; si fuera TIMESTAMP, usar
+-- TIMESTAMP_TRUNC(date_ops_start, MONTH).
+CREATE TABLE `eventos-479403.eventos_pozos.eventos_fix_new`
+PARTITION BY DATETIME_TRUNC(date_ops_start, MONTH)
+CLUSTER BY well_legal_name, event_id, time_from
+AS
+SELECT * FROM `eventos-479403.eventos_pozos.eventos_fix`;
+
+ASSERT (
+  SELECT COUNT(*) FROM `eventos-479403.eventos_pozos.eventos_fix_new`
+) = (
+  SELECT COUNT(*) FROM `eventos-479403.eventos_pozos.eventos_fix`
+) AS 'eventos_fix_new no tiene las mismas filas que eventos_fix';
+
+DROP TABLE `eventos-479403.eventos_pozos.eventos_fix`;
+
+ALTER TABLE `eventos-479403.eventos_pozos.eventos_fix_new`
+RENAME TO eventos_fix;
+
+-- Verificación (dry run, no factura): comparar "bytes processed" del
+-- detalle de un evento con y sin el filtro de fechas que agrega
+-- _get_detalle_evento. Si no bajan, sacar el filtro de app.py.
+--   bq query --dry_run --use_legacy_sql=false \
+--     'SELECT * FROM `eventos-479403.eventos_pozos.eventos_fix`
+--      WHERE well_legal_name = "<pozo>" AND event_id = "<evento>"'
+--   bq query --dry_run --use_legacy_sql=false \
+--     'SELECT * FROM `eventos-479403.eventos_pozos.eventos_fix`
+--      WHERE well_legal_name = "<pozo>" AND event_id = "<evento>"
+--        AND ((date_ops_start >= DATETIME("<desde>")
+--              AND date_ops_start < DATETIME(DATE_ADD("<hasta>", INTERVAL 1 DAY)))
+--             OR date_ops_start IS NULL)'
@@ -0,0 +1,16 @@
+-- DDL de una sola vez: resumen de eventos por pozo, una fila por
+-- (well_legal_name, event_id). get_eventos_de_pozo lee de acá en vez de
+-- agrupar todos los steps del pozo en cada consulta.
+CREATE MATERIALIZED VIEW `eventos-479403.eventos_pozos.eventos_resumen_mv`
+CLUSTER BY well_legal_name
+OPTIONS (enable_refresh = true, refresh_interval_minutes = 30)
+AS
+SELECT
+    well_legal_name,
+    event_id,
+    MIN(date_ops_start) AS date_ops_start,
+    MAX(date_ops_start) AS date_ops_start_max,
+    MAX(date_ops_end)   AS date_ops_end,
+    ANY_VALUE(event_objective_1) AS event_objective_1
+FROM `eventos-479403.eventos_pozos.eventos_fix`
+GROUP BY well_legal_name, event_id;
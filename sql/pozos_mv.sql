@@ -0,0 +1,9 @@
+-- DDL de una sola vez: pozos distintos para el combo. get_pozos lee esta
+-- vista chica en vez de hacer SELECT DISTINCT sobre toda eventos_fix.
+CREATE MATERIALIZED VIEW `eventos-479403.eventos_pozos.pozos_mv`
+OPTIONS (enable_refresh = true, refresh_interval_minutes = 30)
+AS
+SELECT well_legal_name
+FROM `eventos-479403.eventos_pozos.eventos_fix`
+WHERE well_legal_name IS NOT NULL
+GROUP BY well_legal_name;